@@ -0,0 +1,209 @@
+"""不祥事アラートの保存・読み込みを共通化するモジュール
+
+アラートは scandal_alerts.jsonl に1行1レコードで追記保存する。
+全件を書き直す旧JSON形式と違い、追記はレコード数によらずO(1)で済む。
+要約は summaries.jsonl にサイドカーとして追記し、読み込み時にマージする。
+"""
+
+import pickle
+from pathlib import Path
+
+import orjson
+
+BASE_DIR = Path(__file__).parent
+ALERTS_DIR = BASE_DIR / "alerts"
+ALERTS_JSONL = ALERTS_DIR / "scandal_alerts.jsonl"
+SUMMARIES_JSONL = ALERTS_DIR / "summaries.jsonl"
+PROCESSED_DATES_TXT = ALERTS_DIR / "processed_dates.txt"
+ALERTS_CACHE_PKL = ALERTS_DIR / "alerts_cache.pkl"
+LEGACY_ALERTS_JSON = ALERTS_DIR / "scandal_alerts.json"
+
+
+def _alert_key(record: dict) -> tuple[str, str, str]:
+    """要約マージ用のレコードキー。"""
+    return (
+        record.get("日時", ""),
+        record.get("コード", ""),
+        record.get("表題", ""),
+    )
+
+
+def _store_mtimes() -> tuple:
+    """アラート本体とサイドカーの更新時刻。キャッシュの鍵に使う。"""
+
+    def mtime(path: Path):
+        return path.stat().st_mtime_ns if path.exists() else None
+
+    return (mtime(ALERTS_JSONL), mtime(SUMMARIES_JSONL))
+
+
+def load_alerts() -> list[dict]:
+    """全アラートを読み込む。要約サイドカーがあればマージして返す。
+
+    パース・マージ結果はmtime付きのpickleサイドカーにキャッシュし、
+    ファイルが変わっていなければ次回以降の実行で再パースを省く。
+    """
+    cache_key = _store_mtimes()
+    if ALERTS_CACHE_PKL.exists():
+        try:
+            with open(ALERTS_CACHE_PKL, "rb") as f:
+                cached_key, cached_alerts = pickle.load(f)
+            if cached_key == cache_key:
+                return cached_alerts
+        except (pickle.PickleError, EOFError, ValueError, TypeError):
+            pass  # 壊れたキャッシュは無視して再構築する
+
+    alerts: list[dict] = []
+    if ALERTS_JSONL.exists():
+        with open(ALERTS_JSONL, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    alerts.append(orjson.loads(line))
+    elif LEGACY_ALERTS_JSON.exists():
+        # 旧形式（単一JSON配列）からの移行: 読み込んでJSONLに書き直す
+        alerts = orjson.loads(LEGACY_ALERTS_JSON.read_bytes())
+        append_alerts(alerts)
+
+    if SUMMARIES_JSONL.exists():
+        summaries: dict[tuple, str] = {}
+        with open(SUMMARIES_JSONL, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    rec = orjson.loads(line)
+                    summaries[_alert_key(rec)] = rec.get("要約", "")
+        for alert in alerts:
+            summary = summaries.get(_alert_key(alert))
+            if summary:
+                alert["要約"] = summary
+
+    if alerts:
+        # 移行(append_alerts)でmtimeが動いている可能性があるので取り直す
+        tmp_path = ALERTS_CACHE_PKL.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump((_store_mtimes(), alerts), f)
+        tmp_path.replace(ALERTS_CACHE_PKL)
+
+    return alerts
+
+
+class AlertStore:
+    """JSONLファイルを開いたまま追記するためのコンテキストマネージャ。
+
+    ループ内で1件ずつ追記する場合、都度open/closeするとレコードごとに
+    open+close(+フラッシュ)のシステムコールを払うことになる。ハンドルを
+    開いたまま通常のブロックバッファリングに任せ、クローズ時にまとめて
+    書き出す。
+    """
+
+    def __init__(self, path: Path = ALERTS_JSONL):
+        self._path = path
+        self._file = None
+
+    def __enter__(self) -> "AlertStore":
+        ALERTS_DIR.mkdir(parents=True, exist_ok=True)
+        # orjsonはUTF-8のbytesを直接出力するのでバイナリモードで開く
+        self._file = open(self._path, "ab")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._file.close()
+        self._file = None
+
+    def append(self, record: dict) -> None:
+        """1レコードをJSONL行として追記する。"""
+        self._file.write(orjson.dumps(record) + b"\n")
+
+    def extend(self, records: list[dict]) -> None:
+        """複数レコードをまとめて追記する。"""
+        for record in records:
+            self.append(record)
+
+    def flush(self) -> None:
+        """バッファ済みのレコードをOSへ書き出す。
+
+        処理済みインデックスなど他のファイルへ先に到達してはいけない
+        書き込みがある場合、その前に呼ぶ。
+        """
+        self._file.flush()
+
+
+def make_summary_record(alert: dict, summary: str) -> dict:
+    """要約サイドカー用のレコードを作る。"""
+    return {
+        "日時": alert.get("日時", ""),
+        "コード": alert.get("コード", ""),
+        "表題": alert.get("表題", ""),
+        "要約": summary,
+    }
+
+
+def append_alerts(new_alerts: list[dict]) -> None:
+    """新規アラートをJSONLへ追記する。既存レコードは書き直さない。"""
+    with AlertStore() as store:
+        store.extend(new_alerts)
+
+
+def append_summary(alert: dict, summary: str) -> None:
+    """要約をサイドカーJSONLへ追記する。"""
+    with AlertStore(SUMMARIES_JSONL) as store:
+        store.append(make_summary_record(alert, summary))
+
+
+def get_processed_dates(alerts: list[dict]) -> set[str]:
+    """アラート一覧から処理済み日付をYYYYMMDD形式で抽出する。"""
+    dates: set[str] = set()
+    for alert in alerts:
+        dt = alert.get("日時", "")
+        # "2026/01/13 08:30" → "20260113"（先頭10文字の固定フォーマットなので
+        # 正規表現を使わずスライスで取り出す）
+        date_part = dt[:10].replace("/", "")
+        if len(date_part) == 8 and date_part.isdigit():
+            dates.add(date_part)
+    return dates
+
+
+def load_processed_dates() -> set[str]:
+    """処理済み日付の集合を読み込む。
+
+    インデックスファイルがあれば全アラートのパースなしでO(日数)で済む。
+    なければアラートから再構築してインデックスを書き出す。
+    """
+    if PROCESSED_DATES_TXT.exists():
+        with open(PROCESSED_DATES_TXT, encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+
+    dates = get_processed_dates(load_alerts())
+    if dates:
+        ALERTS_DIR.mkdir(parents=True, exist_ok=True)
+        with open(PROCESSED_DATES_TXT, "w", encoding="utf-8") as f:
+            for date_str in sorted(dates):
+                f.write(date_str + "\n")
+    return dates
+
+
+def mark_date_processed(date_str: str) -> None:
+    """日付をインデックスへ追記する。"""
+    ALERTS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(PROCESSED_DATES_TXT, "a", encoding="utf-8") as f:
+        f.write(date_str + "\n")
+
+
+def compact() -> int:
+    """要約をマージした完全なレコードでJSONLを書き直し、サイドカーを消す。"""
+    alerts = load_alerts()
+    if not alerts:
+        return 0
+    tmp_path = ALERTS_JSONL.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        for alert in alerts:
+            f.write(orjson.dumps(alert) + b"\n")
+    tmp_path.replace(ALERTS_JSONL)
+    SUMMARIES_JSONL.unlink(missing_ok=True)
+    return len(alerts)
+
+
+if __name__ == "__main__":
+    count = compact()
+    print(f"コンパクション完了: {count} 件を {ALERTS_JSONL} に書き直しました。")
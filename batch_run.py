@@ -1,58 +1,73 @@
 """TDnetスクレイパーをバッチ実行するスクリプト
 
-指定期間の全日付について tdnet_scraper.py を実行する。
+指定期間の全日付について tdnet_scraper.run を並列実行する。
 既にCSVが存在する日付はスキップする。
 """
 
-import io
-import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, timedelta
 from pathlib import Path
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8")
+sys.stdout.reconfigure(encoding="utf-8")
+sys.stderr.reconfigure(encoding="utf-8")
+
+from tdnet_scraper import run
 
 START_DATE = date(2025, 12, 30)
 END_DATE = date(2026, 2, 6)
 OUTPUT_DIR = Path(__file__).parent / "output"
-SCRIPT = Path(__file__).parent / "tdnet_scraper.py"
+MAX_WORKERS = 6  # 同時実行数（TDnetへの負荷を抑えるため控えめに）
+
+
+def run_date(date_str: str) -> bool:
+    """1日分のスクレイパーをプロセス内で実行する。成功ならTrue。"""
+    try:
+        run(date_str, OUTPUT_DIR)
+        return True
+    except Exception as e:
+        print(f"[エラー] {date_str}: {e}", file=sys.stderr)
+        return False
 
 
 def main():
-    current = START_DATE
     total = (END_DATE - START_DATE).days + 1
-    done = 0
     skipped = 0
-    failed = 0
+    pending: list[date] = []
 
+    current = START_DATE
     while current <= END_DATE:
         date_str = current.strftime("%Y%m%d")
         csv_path = OUTPUT_DIR / f"tdnet_{date_str}.csv"
-
         if csv_path.exists():
             print(f"[スキップ] {current} - 既にCSVが存在します: {csv_path.name}")
             skipped += 1
-            current += timedelta(days=1)
-            continue
-
-        print(f"\n{'=' * 60}")
-        print(f"[実行] {current} ({done + skipped + failed + 1}/{total})")
-        print(f"{'=' * 60}")
+        else:
+            pending.append(current)
+        current += timedelta(days=1)
 
-        result = subprocess.run(
-            [sys.executable, str(SCRIPT), "--date", date_str],
-            encoding="utf-8",
-            errors="replace",
-        )
+    print(f"\n{'=' * 60}")
+    print(f"[実行] {len(pending)} 日分を並列処理します（最大 {MAX_WORKERS} 並列）")
+    print(f"{'=' * 60}")
 
-        if result.returncode == 0:
-            done += 1
-        else:
-            print(f"[警告] {current} の取得に失敗しました (終了コード: {result.returncode})")
-            failed += 1
+    done = 0
+    failed = 0
 
-        current += timedelta(days=1)
+    # 各日付はネットワークI/O待ちが支配的なので、スレッドプールで並列化する。
+    # サブプロセスを起動しないため、日付ごとのインタプリタ起動と
+    # ライブラリimportのコストを払わずに済む。
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(run_date, d.strftime("%Y%m%d")): d for d in pending
+        }
+        for future in as_completed(futures):
+            target = futures[future]
+            if future.result():
+                done += 1
+                print(f"[完了] {target} ({done + failed}/{len(pending)})")
+            else:
+                failed += 1
+                print(f"[警告] {target} の取得に失敗しました")
 
     print(f"\n{'=' * 60}")
     print(f"バッチ処理完了:")
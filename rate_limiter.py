@@ -0,0 +1,25 @@
+"""リクエストレート制限の共通モジュール
+
+スクレイパーとPDFダウンローダが同じ実装を使うために切り出したもの。
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """全スレッド共有でリクエスト開始間隔を制限する簡易レートリミッタ。"""
+
+    def __init__(self, min_interval: float):
+        self._min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self) -> None:
+        """次のリクエストが許可されるまで待機する。"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._min_interval
+        if wait > 0:
+            time.sleep(wait)
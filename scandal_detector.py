@@ -1,7 +1,7 @@
 """不祥事・第三者委員会関連リリース検出ツール
 
 日別CSVの表題をClaude APIで判定し、該当案件のPDFをダウンロードして
-JSONファイルに累積保存する。
+JSONLファイルに累積保存する。
 """
 
 import argparse
@@ -12,6 +12,7 @@ import os
 import re
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date
 from pathlib import Path
 
@@ -22,15 +23,42 @@ from dotenv import load_dotenv
 
 import anthropic
 import requests
+from requests.adapters import HTTPAdapter
+
+from alert_store import (
+    ALERTS_DIR,
+    ALERTS_JSONL,
+    AlertStore,
+    append_alerts,
+    load_processed_dates,
+    mark_date_processed,
+)
+from rate_limiter import RateLimiter
 
 # --- 定数 ---
 MODEL = "claude-haiku-4-5-20251001"
 OUTPUT_DIR = Path(__file__).parent / "output"
-ALERTS_DIR = Path(__file__).parent / "alerts"
-ALERTS_JSON = ALERTS_DIR / "scandal_alerts.json"
 PDF_DIR = ALERTS_DIR / "pdf"
 REQUEST_INTERVAL = 1.0  # PDFダウンロード間隔（秒）
 MAX_RETRIES = 3
+DOWNLOAD_WORKERS = 4  # PDFダウンロードの並列数
+DETECT_WORKERS = 4  # --all時に並列判定する日付数
+
+
+# 並列ダウンロードでも全体のリクエストレートが
+# DOWNLOAD_WORKERS 件/REQUEST_INTERVAL を超えないようにする
+_rate_limiter = RateLimiter(REQUEST_INTERVAL / DOWNLOAD_WORKERS)
+
+# keep-aliveでTCP+TLSハンドシェイクを使い回すための共有セッション
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=0),
+)
+SESSION.headers.update({
+    "User-Agent": "tdnet-scraper/0.1",
+    "Accept-Encoding": "gzip",
+})
 
 SYSTEM_PROMPT = """\
 あなたは日本の上場企業の適時開示情報を分析する専門家です。
@@ -73,6 +101,33 @@ JSON配列で回答してください。該当する表題の番号と判定理
 """
 
 
+# 不祥事関連の表題に現れやすいキーワード。Claudeへ送る前の粗い絞り込みに
+# 使う（最終判定はあくまでClaudeが行う）。SYSTEM_PROMPTの判定基準と
+# 対応させること。
+SCANDAL_KEYWORDS = [
+    "第三者委員会",
+    "調査委員会",
+    "特別調査",
+    "不適切",
+    "不正",
+    "粉飾",
+    "横領",
+    "着服",
+    "流用",
+    "課徴金",
+    "金融庁",
+    "業務改善命令",
+    "業務停止",
+    "行政処分",
+    "懲戒",
+    "改善報告",
+    "再発防止",
+    "法令違反",
+    "コンプライアンス",
+]
+SCANDAL_HINT_RE = re.compile("|".join(SCANDAL_KEYWORDS))
+
+
 def get_api_key() -> str:
     """.envファイルからAPIキーを取得する。"""
     load_dotenv()
@@ -86,38 +141,28 @@ def get_api_key() -> str:
     return key
 
 
-def load_alerts() -> list[dict]:
-    """既存のアラートJSONを読み込む。ファイルがなければ空リスト。"""
-    if not ALERTS_JSON.exists():
-        return []
-    with open(ALERTS_JSON, encoding="utf-8") as f:
-        return json.load(f)
-
-
-def save_alerts(alerts: list[dict]) -> None:
-    """アラートJSONを保存する。"""
-    ALERTS_DIR.mkdir(parents=True, exist_ok=True)
-    with open(ALERTS_JSON, "w", encoding="utf-8") as f:
-        json.dump(alerts, f, ensure_ascii=False, indent=2)
-
-
-def get_processed_dates(alerts: list[dict]) -> set[str]:
-    """処理済み日付の一覧を取得する。日時フィールドからYYYYMMDD形式で抽出。"""
-    dates: set[str] = set()
-    for alert in alerts:
-        dt = alert.get("日時", "")
-        # "2026/01/13 08:30" → "20260113"
-        match = re.match(r"(\d{4})/(\d{2})/(\d{2})", dt)
-        if match:
-            dates.add(match.group(1) + match.group(2) + match.group(3))
-    return dates
+# 判定・保存で参照する列。CSVの全8列を辞書化する必要はない
+_CSV_COLUMNS = ("日時", "コード", "会社名", "表題", "PDF_URL")
 
 
 def read_csv(csv_path: Path) -> list[dict]:
-    """CSVファイルを読み込む。"""
-    with open(csv_path, encoding="utf-8-sig") as f:
-        reader = csv.DictReader(f)
-        return list(reader)
+    """CSVファイルから判定に必要な列だけを読み込む。
+
+    DictReaderは行ごとに全列の辞書を組み立てるため、列位置を先に
+    解決してcsv.readerで必要な列だけ取り出す。
+    """
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        try:
+            header = next(reader)
+        except StopIteration:
+            return []
+        indexes = [(col, header.index(col)) for col in _CSV_COLUMNS]
+        return [
+            {col: row[i] for col, i in indexes}
+            for row in reader
+            if row  # 空行はDictReader同様に読み飛ばす
+        ]
 
 
 def detect_scandals(
@@ -127,16 +172,30 @@ def detect_scandals(
     if not records:
         return []
 
+    # キーワードで粗く絞り込み、関係のない表題のトークン送信を省く。
+    # 1件もヒットしなければAPI呼び出し自体が不要。
+    candidates = [rec for rec in records if SCANDAL_HINT_RE.search(rec["表題"])]
+    if not candidates:
+        return []
+
     # 表題一覧を番号付きで作成
     lines = []
-    for i, rec in enumerate(records, 1):
+    for i, rec in enumerate(candidates, 1):
         lines.append(f"{i}. {rec['表題']}")
     user_message = "以下の表題一覧を判定してください。\n" + "\n".join(lines)
 
     response = client.messages.create(
         model=MODEL,
         max_tokens=4096,
-        system=SYSTEM_PROMPT,
+        # システムプロンプトをサーバ側にキャッシュして、連続判定時の
+        # 入力トークン課金とTTFTを抑える
+        system=[
+            {
+                "type": "text",
+                "text": SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"},
+            }
+        ],
         messages=[{"role": "user", "content": user_message}],
     )
 
@@ -148,9 +207,9 @@ def detect_scandals(
     for match in matches:
         idx = match.get("番号")
         reason = match.get("判定理由", "")
-        if idx is None or not (1 <= idx <= len(records)):
+        if idx is None or not (1 <= idx <= len(candidates)):
             continue
-        rec = records[idx - 1]
+        rec = candidates[idx - 1]
         results.append({
             "日時": rec["日時"],
             "コード": rec["コード"],
@@ -158,6 +217,8 @@ def detect_scandals(
             "表題": rec["表題"],
             "PDF_URL": rec["PDF_URL"],
             "pdf_path": "",
+            "etag": "",
+            "last_modified": "",
             "判定理由": reason,
             "要約": "",
             "検出日": date.today().isoformat(),
@@ -166,39 +227,86 @@ def detect_scandals(
 
 
 def _extract_json_array(text: str) -> list[dict]:
-    """テキストからJSON配列を抽出する。"""
-    # コードブロック内のJSONを優先
-    code_block = re.search(r"```(?:json)?\s*(\[.*?])\s*```", text, re.DOTALL)
-    if code_block:
-        try:
-            return json.loads(code_block.group(1))
-        except json.JSONDecodeError:
-            pass
-
-    # テキスト全体から配列を探す
-    bracket_match = re.search(r"\[.*]", text, re.DOTALL)
-    if bracket_match:
-        try:
-            return json.loads(bracket_match.group(0))
-        except json.JSONDecodeError:
-            pass
-
+    """テキストから最初の「dictのJSON配列」を抽出する。
+
+    DOTALLな正規表現はモデル出力の雑音でバックトラックし得るため、
+    「[」ごとに括弧の対応をO(n)で走査する。候補がパースできない場合や
+    dictの配列でない場合（前置きの「注[1]」のような括弧書き）は、
+    次の「[」から走査し直す。文字列リテラル内の括弧は数えない。
+    """
+    start = text.find("[")
+    while start >= 0:
+        depth = 0
+        in_string = False
+        escaped = False
+        for i in range(start, len(text)):
+            char = text[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "[":
+                depth += 1
+            elif char == "]":
+                depth -= 1
+                if depth == 0:
+                    try:
+                        parsed = json.loads(text[start:i + 1])
+                    except json.JSONDecodeError:
+                        break
+                    if isinstance(parsed, list) and all(
+                        isinstance(item, dict) for item in parsed
+                    ):
+                        return parsed
+                    break
+        start = text.find("[", start + 1)
     return []
 
 
-def download_pdf(url: str, save_path: Path) -> bool:
-    """PDFをダウンロードする。既に存在する場合はスキップ。"""
+def download_pdf(url: str, save_path: Path, alert: dict | None = None) -> bool:
+    """PDFをダウンロードする。既に存在する場合はスキップ。
+
+    alertを渡すと取得時のETag/Last-Modifiedを記録し、ローカルに
+    ファイルがない再取得では条件付きGETで未変更（304）を検出する。
+    """
     if save_path.exists():
         return True
 
     save_path.parent.mkdir(parents=True, exist_ok=True)
 
+    headers = {}
+    if alert:
+        # 以前の取得時の検証子が残っていれば条件付きGETにする
+        if alert.get("etag"):
+            headers["If-None-Match"] = alert["etag"]
+        if alert.get("last_modified"):
+            headers["If-Modified-Since"] = alert["last_modified"]
+
+    # 途中で切断されても不完全なPDFが残らないよう、一時ファイルに書いてから置き換える
+    tmp_path = save_path.with_suffix(".part")
     for attempt in range(MAX_RETRIES):
+        _rate_limiter.wait()
         try:
-            resp = requests.get(url, timeout=30)
-            resp.raise_for_status()
-            with open(save_path, "wb") as f:
-                f.write(resp.content)
+            # PDF全体をメモリに載せず、チャンク単位でファイルへ書き出す
+            with SESSION.get(url, stream=True, timeout=30, headers=headers) as resp:
+                if resp.status_code == 304:
+                    # サーバ側は未変更。ローカルコピーが消えているだけなので
+                    # 転送はせず警告に留める
+                    print(f"  警告: PDFはサーバ側で未変更です（304）: {save_path.name}")
+                    return False
+                resp.raise_for_status()
+                with open(tmp_path, "wb") as f:
+                    for chunk in resp.iter_content(chunk_size=65536):
+                        f.write(chunk)
+                if alert is not None:
+                    alert["etag"] = resp.headers.get("ETag", "")
+                    alert["last_modified"] = resp.headers.get("Last-Modified", "")
+            tmp_path.replace(save_path)
             return True
         except requests.RequestException as e:
             if attempt < MAX_RETRIES - 1:
@@ -208,6 +316,7 @@ def download_pdf(url: str, save_path: Path) -> bool:
             else:
                 print(f"  警告: PDFのダウンロードに失敗しました: {url}")
                 print(f"    {e}")
+                tmp_path.unlink(missing_ok=True)
                 return False
     return False
 
@@ -217,6 +326,27 @@ def _make_pdf_filename(date_str: str, code: str, seq: int) -> str:
     return f"{date_str}_{code}_{seq:03d}.pdf"
 
 
+def _download_one(alert: dict, pdf_path: Path) -> None:
+    """1件のPDFをダウンロードし、成功したらalertに保存先を反映する。"""
+    if download_pdf(alert["PDF_URL"], pdf_path, alert):
+        alert["pdf_path"] = str(pdf_path.relative_to(Path(__file__).parent))
+
+
+def _make_dummy_alert(date_str: str) -> dict:
+    """該当なしの日付を処理済みとして記録するためのダミーエントリを作る。"""
+    return {
+        "日時": f"{date_str[:4]}/{date_str[4:6]}/{date_str[6:8]}",
+        "コード": "",
+        "会社名": "",
+        "表題": "",
+        "PDF_URL": "",
+        "pdf_path": "",
+        "判定理由": "_処理済み（該当なし）",
+        "要約": "",
+        "検出日": date.today().isoformat(),
+    }
+
+
 def process_date(date_str: str, client: anthropic.Anthropic) -> list[dict]:
     """指定日付のCSVを読み込み、不祥事判定→PDFダウンロードを行う。"""
     csv_path = OUTPUT_DIR / f"tdnet_{date_str}.csv"
@@ -238,20 +368,23 @@ def process_date(date_str: str, client: anthropic.Anthropic) -> list[dict]:
 
     print(f"  {len(detected)} 件検出。PDFをダウンロード中...")
 
-    # 同一日付・同一コードの連番管理
+    # 同一日付・同一コードの連番は逐次で確定し、ダウンロードだけ並列化する
     code_counter: dict[str, int] = {}
+    targets: list[tuple[dict, Path]] = []
     for alert in detected:
         code = alert["コード"]
         code_counter[code] = code_counter.get(code, 0) + 1
         seq = code_counter[code]
 
-        pdf_filename = _make_pdf_filename(date_str, code, seq)
-        pdf_path = PDF_DIR / pdf_filename
-
         if alert["PDF_URL"]:
-            if download_pdf(alert["PDF_URL"], pdf_path):
-                alert["pdf_path"] = str(pdf_path.relative_to(Path(__file__).parent))
-            time.sleep(REQUEST_INTERVAL)
+            pdf_path = PDF_DIR / _make_pdf_filename(date_str, code, seq)
+            targets.append((alert, pdf_path))
+
+    # ダウンロードはネットワーク待ちが支配的なのでスレッドで重ねる
+    # （リクエストレートはdownload_pdf内のレートリミッタで制限される）
+    if targets:
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            list(executor.map(lambda t: _download_one(*t), targets))
 
     return detected
 
@@ -275,9 +408,8 @@ def main():
     api_key = get_api_key()
     client = anthropic.Anthropic(api_key=api_key)
 
-    # 既存アラートを読み込み
-    alerts = load_alerts()
-    processed_dates = get_processed_dates(alerts)
+    # 処理済み日付のインデックスを読み込み（全アラートのパースは不要）
+    processed_dates = load_processed_dates()
 
     if args.date:
         date_str = args.date.replace("-", "").replace("/", "")
@@ -287,24 +419,13 @@ def main():
         print(f"日付: {date_str}")
         new_alerts = process_date(date_str, client)
         if new_alerts:
-            alerts.extend(new_alerts)
-            save_alerts(alerts)
-            print(f"\n完了: {len(new_alerts)} 件を {ALERTS_JSON} に追加しました。")
+            append_alerts(new_alerts)
+            print(f"\n完了: {len(new_alerts)} 件を {ALERTS_JSONL} に追加しました。")
         else:
             # 該当なしでも処理済みとして記録（ダミーエントリ）
-            alerts.append({
-                "日時": f"{date_str[:4]}/{date_str[4:6]}/{date_str[6:8]}",
-                "コード": "",
-                "会社名": "",
-                "表題": "",
-                "PDF_URL": "",
-                "pdf_path": "",
-                "判定理由": "_処理済み（該当なし）",
-                "要約": "",
-                "検出日": date.today().isoformat(),
-            })
-            save_alerts(alerts)
+            append_alerts([_make_dummy_alert(date_str)])
             print(f"\n完了: 該当案件なし。")
+        mark_date_processed(date_str)
     else:
         # --all: output/ 内の全CSVを処理
         csv_files = sorted(OUTPUT_DIR.glob("tdnet_*.csv"))
@@ -312,41 +433,47 @@ def main():
             print("CSVファイルが見つかりません。")
             return
 
-        total_new = 0
+        pending_dates = []
         for csv_file in csv_files:
             date_str = csv_file.stem.replace("tdnet_", "")
             if date_str in processed_dates:
                 print(f"[スキップ] {date_str} - 処理済み")
-                continue
+            else:
+                pending_dates.append(date_str)
 
-            print(f"\n{'=' * 50}")
-            print(f"[判定] {date_str}")
-            print(f"{'=' * 50}")
+        print(f"\n{'=' * 50}")
+        print(f"[判定] {len(pending_dates)} 日分を並列処理します（最大 {DETECT_WORKERS} 並列）")
+        print(f"{'=' * 50}")
 
-            new_alerts = process_date(date_str, client)
-            if new_alerts:
-                alerts.extend(new_alerts)
-                total_new += len(new_alerts)
-            else:
-                # 該当なしでも処理済みとして記録
-                alerts.append({
-                    "日時": f"{date_str[:4]}/{date_str[4:6]}/{date_str[6:8]}",
-                    "コード": "",
-                    "会社名": "",
-                    "表題": "",
-                    "PDF_URL": "",
-                    "pdf_path": "",
-                    "判定理由": "_処理済み（該当なし）",
-                    "要約": "",
-                    "検出日": date.today().isoformat(),
-                })
-
-            # 都度保存（中断対策）
-            save_alerts(alerts)
+        # 各日付の判定はAPI往復待ちが支配的なので、日付単位で並列化して
+        # システムプロンプト送信とRTTを重ね合わせる
+        total_new = 0
+        # ファイルは開いたままにして日付ごとのopen/closeを省く
+        with AlertStore() as store, ThreadPoolExecutor(
+            max_workers=DETECT_WORKERS
+        ) as executor:
+            futures = {
+                executor.submit(process_date, d, client): d for d in pending_dates
+            }
+            for future in as_completed(futures):
+                date_str = futures[future]
+                new_alerts = future.result()
+                if new_alerts:
+                    store.extend(new_alerts)
+                    total_new += len(new_alerts)
+                    print(f"[完了] {date_str}: 新規 {len(new_alerts)} 件")
+                else:
+                    # 該当なしでも処理済みとして記録
+                    store.append(_make_dummy_alert(date_str))
+                    print(f"[完了] {date_str}: 該当なし")
+                # アラート本体が確実にJSONLへ届いてから処理済みを記録する。
+                # 逆順だと途中killでアラート喪失のまま日付がスキップされ続ける
+                store.flush()
+                mark_date_processed(date_str)
 
         print(f"\n{'=' * 50}")
         print(f"全日付の判定完了: 新規 {total_new} 件を検出しました。")
-        print(f"結果: {ALERTS_JSON}")
+        print(f"結果: {ALERTS_JSONL}")
         print(f"{'=' * 50}")
 
 
@@ -1,14 +1,15 @@
 """不祥事リリースPDF要約ツール
 
-scandal_alerts.json 内の未要約レコードについて、
+scandal_alerts.jsonl 内の未要約レコードについて、
 ダウンロード済みPDFからテキストを抽出し、Claude APIで要約を生成する。
 """
 
 import argparse
 import io
-import json
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
@@ -19,10 +20,17 @@ from dotenv import load_dotenv
 import anthropic
 import pymupdf
 
+import alert_store
+from alert_store import (
+    ALERTS_JSONL,
+    SUMMARIES_JSONL,
+    AlertStore,
+    make_summary_record,
+)
+
 # --- 定数 ---
 MODEL = "claude-haiku-4-5-20251001"
 BASE_DIR = Path(__file__).parent
-ALERTS_JSON = BASE_DIR / "alerts" / "scandal_alerts.json"
 
 SUMMARY_PROMPT = """\
 この適時開示資料の内容を以下の観点で要約してください:
@@ -38,6 +46,8 @@ SUMMARY_PROMPT = """\
 # PDFテキスト抽出の最大文字数（APIコスト制御）
 MAX_TEXT_LENGTH = 50000
 
+SUMMARY_WORKERS = 4  # 抽出・要約の並列数
+
 
 def get_api_key() -> str:
     """.envファイルからAPIキーを取得する。"""
@@ -53,27 +63,28 @@ def get_api_key() -> str:
 
 
 def load_alerts() -> list[dict]:
-    """アラートJSONを読み込む。"""
-    if not ALERTS_JSON.exists():
+    """アラートを読み込む。ファイルがなければエラー終了。"""
+    alerts = alert_store.load_alerts()
+    if not alerts:
         print("エラー: アラートファイルが見つかりません。", file=sys.stderr)
         print(f"  先に scandal_detector.py を実行してください。", file=sys.stderr)
         sys.exit(1)
-    with open(ALERTS_JSON, encoding="utf-8") as f:
-        return json.load(f)
-
-
-def save_alerts(alerts: list[dict]) -> None:
-    """アラートJSONを保存する。"""
-    with open(ALERTS_JSON, "w", encoding="utf-8") as f:
-        json.dump(alerts, f, ensure_ascii=False, indent=2)
+    return alerts
 
 
 def extract_text_from_pdf(pdf_path: Path) -> str:
-    """PDFからテキストを抽出する。"""
+    """PDFからテキストを抽出する。上限に達したら以降のページは読まない。"""
     doc = pymupdf.open(pdf_path)
     text_parts = []
+    total = 0
     for page in doc:
-        text_parts.append(page.get_text())
+        # プレーンテキストのみ抽出（画像・レイアウト解析は不要）
+        text = page.get_text("text", flags=pymupdf.TEXTFLAGS_TEXT)
+        text_parts.append(text)
+        total += len(text) + 1  # 結合時の改行分
+        # 上限を超えた分はどうせ切り捨てるので、残りページは抽出しない
+        if total >= MAX_TEXT_LENGTH:
+            break
     doc.close()
 
     full_text = "\n".join(text_parts)
@@ -95,12 +106,48 @@ def summarize_text(
     response = client.messages.create(
         model=MODEL,
         max_tokens=1024,
-        system=SUMMARY_PROMPT,
+        # システムプロンプトをサーバ側にキャッシュして、連続要約時の
+        # 入力トークン課金とTTFTを抑える
+        system=[
+            {
+                "type": "text",
+                "text": SUMMARY_PROMPT,
+                "cache_control": {"type": "ephemeral"},
+            }
+        ],
         messages=[{"role": "user", "content": user_message}],
     )
     return response.content[0].text
 
 
+def _summarize_one(
+    alert: dict,
+    client: anthropic.Anthropic,
+    store: AlertStore,
+    store_lock: threading.Lock,
+) -> str | None:
+    """1件のPDFを抽出・要約し、サイドカーへ追記する。
+
+    要約できなかった場合はNoneを返す。抽出不可はその場で記録する。
+    """
+    pdf_path = BASE_DIR / alert["pdf_path"]
+    if not pdf_path.exists():
+        print(f"  警告: PDFが見つかりません: {pdf_path}")
+        return None
+
+    text = extract_text_from_pdf(pdf_path)
+    if not text.strip():
+        print(f"  警告: PDFからテキストを抽出できませんでした: {pdf_path.name}")
+        with store_lock:
+            store.append(make_summary_record(alert, "（テキスト抽出不可）"))
+        return None
+
+    summary = summarize_text(text, alert["表題"], alert["会社名"], client)
+    with store_lock:
+        store.append(make_summary_record(alert, summary))
+    return summary
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="不祥事リリースPDFの要約を生成する"
@@ -137,40 +184,36 @@ def main():
     print(f"未要約: {len(unsummarized)} 件 / 今回処理: {len(targets)} 件\n")
 
     done = 0
-    for idx, (alert_idx, alert) in enumerate(targets, 1):
-        pdf_path = BASE_DIR / alert["pdf_path"]
-
-        print(f"[{idx}/{len(targets)}] {alert['会社名']} - {alert['表題'][:40]}...")
-
-        if not pdf_path.exists():
-            print(f"  警告: PDFが見つかりません: {pdf_path}")
-            continue
-
-        # テキスト抽出
-        text = extract_text_from_pdf(pdf_path)
-        if not text.strip():
-            print(f"  警告: PDFからテキストを抽出できませんでした")
-            alert["要約"] = "（テキスト抽出不可）"
-            save_alerts(alerts)
-            continue
-
-        # 要約生成
-        try:
-            summary = summarize_text(
-                text, alert["表題"], alert["会社名"], client
-            )
-            alerts[alert_idx]["要約"] = summary
-            done += 1
-            print(f"  要約完了（{len(summary)}文字）")
-        except anthropic.APIError as e:
-            print(f"  エラー: API呼び出しに失敗しました: {e}")
-            continue
-
-        # 都度保存（中断対策）
-        save_alerts(alerts)
+    # テキスト抽出（CPU側）とAPI呼び出し（ネットワーク待ち）はボトルネックが
+    # 異なるので、スレッドプールで重ね合わせる。サイドカーへの追記は
+    # ロックで直列化する。
+    with AlertStore(SUMMARIES_JSONL) as store:
+        store_lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+            futures = {
+                executor.submit(_summarize_one, alert, client, store, store_lock): (
+                    alert_idx,
+                    alert,
+                )
+                for alert_idx, alert in targets
+            }
+            for idx, future in enumerate(as_completed(futures), 1):
+                alert_idx, alert = futures[future]
+                label = f"[{idx}/{len(targets)}] {alert['会社名']} - {alert['表題'][:40]}"
+                try:
+                    summary = future.result()
+                except anthropic.APIError as e:
+                    print(f"{label}")
+                    print(f"  エラー: API呼び出しに失敗しました: {e}")
+                    continue
+                if summary is not None:
+                    alerts[alert_idx]["要約"] = summary
+                    done += 1
+                    print(f"{label}")
+                    print(f"  要約完了（{len(summary)}文字）")
 
     print(f"\n完了: {done}/{len(targets)} 件の要約を生成しました。")
-    print(f"結果: {ALERTS_JSON}")
+    print(f"結果: {ALERTS_JSONL}")
 
 
 if __name__ == "__main__":
@@ -6,26 +6,56 @@
 
 import argparse
 import csv
-import io
 import math
 import re
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
 # Windows環境での文字化け対策: 標準出力/エラーをUTF-8に設定
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8")
+# （reconfigureなら他モジュールからimportされても二重ラップしない）
+sys.stdout.reconfigure(encoding="utf-8")
+sys.stderr.reconfigure(encoding="utf-8")
 
 import requests
-from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
+
+from rate_limiter import RateLimiter
 
 BASE_URL = "https://www.release.tdnet.info/inbs/"
 LIST_URL_TEMPLATE = BASE_URL + "I_list_{page:03d}_{date}.html"
 REQUEST_INTERVAL = 1.0  # リクエスト間隔（秒）
 MAX_RETRIES = 3
 ITEMS_PER_PAGE = 100
+FETCH_WORKERS = 4  # ページ取得の並列数
+
+# keep-aliveでTCP+TLSハンドシェイクを使い回すための共有セッション
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=0),
+)
+SESSION.headers.update({
+    "User-Agent": "tdnet-scraper/0.1",
+    "Accept-Encoding": "gzip",
+})
+
+# プリコンパイル済みXPath（BeautifulSoupより大幅に高速な直接lxml検索）
+# classは複数指定される可能性があるため、完全一致ではなくトークン一致で探す
+_CLASS_TOKEN = "contains(concat(' ', normalize-space(@class), ' '), $name)"
+_PAGER_XPATH = etree.XPath(f"//td[{_CLASS_TOKEN}]")
+_TABLE_XPATH = etree.XPath("//table[@id='main-list-table']")
+_ROW_XPATH = etree.XPath("./tr")
+_TOTAL_COUNT_RE = re.compile(r"全(\d+)件")
+
+
+# 並列取得でも全体のリクエストレートが FETCH_WORKERS 件/REQUEST_INTERVAL を
+# 超えないようにする
+_rate_limiter = RateLimiter(REQUEST_INTERVAL / FETCH_WORKERS)
 
 
 def parse_date(date_str: str) -> str:
@@ -47,12 +77,18 @@ def format_date(date_str: str) -> str:
 
 
 def fetch_page(url: str) -> requests.Response:
-    """URLからHTMLを取得する。リトライ付き。"""
+    """URLからHTMLを取得する。リトライしても失敗した場合は例外を送出する。"""
     for attempt in range(MAX_RETRIES):
+        _rate_limiter.wait()
         try:
-            resp = requests.get(url, timeout=30)
+            resp = SESSION.get(url, timeout=30)
             resp.raise_for_status()
-            resp.encoding = resp.apparent_encoding
+            # apparent_encodingはHTML全文をchardetでスキャンするため重い。
+            # ヘッダにcharset指定があればrequestsがresp.encodingに設定済み
+            # なので、無指定時のISO-8859-1フォールバックだけUTF-8（TDnetの
+            # 実際のエンコーディング）へ差し替える
+            if "charset" not in resp.headers.get("Content-Type", "").lower():
+                resp.encoding = "utf-8"
             return resp
         except requests.RequestException as e:
             if attempt < MAX_RETRIES - 1:
@@ -62,67 +98,76 @@ def fetch_page(url: str) -> requests.Response:
             else:
                 print(f"エラー: ページの取得に失敗しました: {url}", file=sys.stderr)
                 print(f"  {e}", file=sys.stderr)
-                sys.exit(1)
+                raise
 
 
-def parse_total_count(soup: BeautifulSoup) -> int:
+def parse_total_count(doc: lxml_html.HtmlElement) -> int:
     """ページから全件数を取得する。"""
-    pager = soup.find("td", class_="pagerTd")
-    if not pager:
+    pagers = _PAGER_XPATH(doc, name=" pagerTd ")
+    if not pagers:
         return 0
-    text = pager.get_text(strip=True)
-    match = re.search(r"全(\d+)件", text)
+    text = pagers[0].text_content()
+    match = _TOTAL_COUNT_RE.search(text)
     if match:
         return int(match.group(1))
     return 0
 
 
-def is_no_data(soup: BeautifulSoup) -> bool:
-    """「開示された情報はありません」かどうかを判定する。"""
-    text = soup.get_text()
-    return "に開示された情報はありません" in text
+def _row_cells(row: lxml_html.HtmlElement) -> dict[str, lxml_html.HtmlElement]:
+    """行のtdをclassトークンごとに1パスで索引化する。
+
+    列ごとにXPath検索を繰り返すと行の子要素を何度も線形走査することに
+    なるため、先にまとめて辞書化しておく。
+    """
+    cells: dict[str, lxml_html.HtmlElement] = {}
+    for td in row.findall("td"):
+        for name in (td.get("class") or "").split():
+            cells.setdefault(name, td)
+    return cells
 
 
-def _cell_text(row, class_name: str) -> str:
-    """行からセルを探してテキストを返す。見つからなければ空文字列。"""
-    cell = row.find("td", class_=class_name)
-    return cell.get_text(strip=True) if cell else ""
+def _cell_text(cells: dict[str, lxml_html.HtmlElement], class_name: str) -> str:
+    """セル辞書からテキストを返す。見つからなければ空文字列。"""
+    cell = cells.get(class_name)
+    return cell.text_content().strip() if cell is not None else ""
 
 
-def _cell_link(row, class_name: str) -> str:
-    """行からセルを探してリンクURLを返す。見つからなければ空文字列。"""
-    cell = row.find("td", class_=class_name)
-    if not cell:
+def _cell_link(cells: dict[str, lxml_html.HtmlElement], class_name: str) -> str:
+    """セル辞書からリンクURLを返す。見つからなければ空文字列。"""
+    cell = cells.get(class_name)
+    if cell is None:
         return ""
-    a_tag = cell.find("a")
-    if a_tag and a_tag.get("href"):
-        return BASE_URL + a_tag["href"]
+    # BeautifulSoupのfind("a")と同じく子孫も探す（lxmlのfind("a")は直下のみ）
+    a_tag = cell.find(".//a")
+    if a_tag is not None and a_tag.get("href"):
+        return BASE_URL + a_tag.get("href")
     return ""
 
 
-def parse_rows(soup: BeautifulSoup, date_str: str) -> list[dict]:
+def parse_rows(doc: lxml_html.HtmlElement, date_str: str) -> list[dict]:
     """HTMLテーブルからデータ行をパースする。"""
-    table = soup.find("table", id="main-list-table")
-    if not table:
+    tables = _TABLE_XPATH(doc)
+    if not tables:
         return []
 
     date_formatted = format_date(date_str)
     records = []
 
-    for row in table.find_all("tr", recursive=False):
-        time_text = _cell_text(row, "kjTime")
+    for row in _ROW_XPATH(tables[0]):
+        cells = _row_cells(row)
+        time_text = _cell_text(cells, "kjTime")
         if not time_text:
             continue
 
         records.append({
             "日時": f"{date_formatted} {time_text}",
-            "コード": _cell_text(row, "kjCode"),
-            "会社名": _cell_text(row, "kjName"),
-            "表題": _cell_text(row, "kjTitle"),
-            "PDF_URL": _cell_link(row, "kjTitle"),
-            "XBRL_URL": _cell_link(row, "kjXbrl"),
-            "上場取引所": _cell_text(row, "kjPlace"),
-            "更新履歴": _cell_text(row, "kjHistroy"),  # typo in original HTML
+            "コード": _cell_text(cells, "kjCode"),
+            "会社名": _cell_text(cells, "kjName"),
+            "表題": _cell_text(cells, "kjTitle"),
+            "PDF_URL": _cell_link(cells, "kjTitle"),
+            "XBRL_URL": _cell_link(cells, "kjXbrl"),
+            "上場取引所": _cell_text(cells, "kjPlace"),
+            "更新履歴": _cell_text(cells, "kjHistroy"),  # typo in original HTML
         })
 
     return records
@@ -139,62 +184,77 @@ def save_csv(records: list[dict], output_path: Path) -> None:
         writer.writerows(records)
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="TDnet 適時開示情報をCSVで取得する"
-    )
-    parser.add_argument(
-        "--date",
-        required=True,
-        help="取得対象日（YYYYMMDD または YYYY-MM-DD）",
-    )
-    parser.add_argument(
-        "--output",
-        default="./output",
-        help="CSV出力先ディレクトリ（デフォルト: ./output）",
-    )
-    args = parser.parse_args()
-
-    date_str = parse_date(args.date)
-    output_dir = Path(args.output)
+def run(date_str: str, output_dir: Path) -> int:
+    """1日分の開示情報を取得してCSVに保存し、件数を返す。
 
+    date_strはYYYYMMDD形式であること。取得に失敗した場合は
+    requests.RequestExceptionを送出する。
+    """
     print(f"日付: {format_date(date_str)}")
 
     # 1ページ目を取得
     first_url = LIST_URL_TEMPLATE.format(page=1, date=date_str)
     print(f"1ページ目を取得中: {first_url}")
     resp = fetch_page(first_url)
-    soup = BeautifulSoup(resp.text, "lxml")
 
-    # データなしチェック
-    if is_no_data(soup):
+    # データなしチェック（DOMを構築するまでもなく生HTMLで判定できる）
+    if "に開示された情報はありません" in resp.text:
         print("この日に開示された情報はありません。")
-        return
+        return 0
+
+    doc = lxml_html.fromstring(resp.text)
 
     # 全件数・ページ数を取得
-    total_count = parse_total_count(soup)
+    total_count = parse_total_count(doc)
     total_pages = math.ceil(total_count / ITEMS_PER_PAGE)
     print(f"全 {total_count} 件（{total_pages} ページ）")
 
     # 1ページ目のデータをパース
-    all_records = parse_rows(soup, date_str)
+    all_records = parse_rows(doc, date_str)
     print(f"  1/{total_pages} ページ: {len(all_records)} 件取得")
 
-    # 2ページ目以降を取得
-    for page in range(2, total_pages + 1):
-        time.sleep(REQUEST_INTERVAL)
-        url = LIST_URL_TEMPLATE.format(page=page, date=date_str)
-        print(f"  {page}/{total_pages} ページを取得中...")
-        resp = fetch_page(url)
-        soup = BeautifulSoup(resp.text, "lxml")
-        records = parse_rows(soup, date_str)
-        all_records.extend(records)
-        print(f"  {page}/{total_pages} ページ: {len(records)} 件取得")
+    # 2ページ目以降を並列取得（ネットワーク待ちが支配的なのでスレッドで重ねる）
+    if total_pages > 1:
+        urls = [
+            LIST_URL_TEMPLATE.format(page=page, date=date_str)
+            for page in range(2, total_pages + 1)
+        ]
+        print(f"  2〜{total_pages} ページを取得中（最大 {FETCH_WORKERS} 並列）...")
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+            responses = list(executor.map(fetch_page, urls))
+        for page, resp in enumerate(responses, start=2):
+            doc = lxml_html.fromstring(resp.text)
+            records = parse_rows(doc, date_str)
+            all_records.extend(records)
+            print(f"  {page}/{total_pages} ページ: {len(records)} 件取得")
 
     # CSV出力
     output_path = output_dir / f"tdnet_{date_str}.csv"
     save_csv(all_records, output_path)
     print(f"\n完了: {len(all_records)} 件を {output_path} に保存しました。")
+    return len(all_records)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="TDnet 適時開示情報をCSVで取得する"
+    )
+    parser.add_argument(
+        "--date",
+        required=True,
+        help="取得対象日（YYYYMMDD または YYYY-MM-DD）",
+    )
+    parser.add_argument(
+        "--output",
+        default="./output",
+        help="CSV出力先ディレクトリ（デフォルト: ./output）",
+    )
+    args = parser.parse_args()
+
+    try:
+        run(parse_date(args.date), Path(args.output))
+    except requests.RequestException:
+        sys.exit(1)
 
 
 if __name__ == "__main__":